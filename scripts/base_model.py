@@ -62,7 +62,7 @@ class BasicCNN(tf.keras.Model):
 		:param labels: correct labels for given batch [batch_sz]
 		:returns: final task loss as tf scalar
 		"""
-        loss = tf.nn.sparse_softmax_cross_entropy_with_logits(labels, logits)
+        loss = tf.nn.sparse_softmax_cross_entropy_with_logits(tf.cast(labels, tf.int64), logits)
 
         return tf.reduce_mean(loss)
 
@@ -73,7 +73,7 @@ class BasicCNN(tf.keras.Model):
 		:param labels: correct labels for given batch [batch_sz]
 		:returns: batch accuracy as tf scalar
 		"""
-        num_correct_predictions = tf.equal(tf.argmax(logits, 1), labels)
+        num_correct_predictions = tf.equal(tf.argmax(logits, 1), tf.cast(labels, tf.int64))
 
         return tf.reduce_mean(tf.cast(num_correct_predictions, tf.float32))
 
@@ -126,7 +126,7 @@ class MaskedCNN(tf.keras.Model):
         :param logits: raw predictions of shape [batch_sz, 10]
         :param labels: correct labels for given batch [batch_sz]
         """
-        loss = tf.nn.sparse_softmax_cross_entropy_with_logits(labels, logits)
+        loss = tf.nn.sparse_softmax_cross_entropy_with_logits(tf.cast(labels, tf.int64), logits)
 
         return tf.reduce_mean(loss)
 
@@ -136,7 +136,7 @@ class MaskedCNN(tf.keras.Model):
         :param logits: raw predictions of shape [batch_sz, 10]
         :param labels: correct labels for given batch [batch_sz]
         """
-        num_correct_predictions = tf.equal(tf.argmax(logits, 1), labels)
+        num_correct_predictions = tf.equal(tf.argmax(logits, 1), tf.cast(labels, tf.int64))
 
         return tf.reduce_mean(tf.cast(num_correct_predictions, tf.float32))
 
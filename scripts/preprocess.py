@@ -3,10 +3,12 @@ import librosa.display
 import matplotlib
 import matplotlib.pyplot as plt
 import numpy as np
-from playsound import playsound
+import soundfile as sf
+import scipy.fft
+import scipy.signal
 from scipy.io.wavfile import write
 from skimage import io
-from random import shuffle
+from concurrent.futures import ProcessPoolExecutor
 import os
 import tensorflow as tf
 
@@ -18,61 +20,176 @@ hop_length = 512
 n_fft = 2048
 # partition entire frequency spectrum into 128 evenly spaced frequencies to the human ear (ie mel scale, not absolute)
 n_mels = 128
+# one directory of wavs per genre under data_dir, in label order (a genre's label is its index)
+data_dir = "../data"
+genre_names = ("blues", "classical", "country", "disco", "hiphop", "jazz", "metal", "pop", "reggae", "rock")
+# unreadable wav in the dataset, left out of preprocessing
+skip_wav = os.path.join(data_dir, "jazz", "jazz.00054.wav")
+# where main() caches the preprocessed groups, one .npy file per entry of split_names
+# NOTE: the cache is not invalidated automatically, delete this directory by hand after
+# changing the spectrogram parameters or preprocessing code
+cache_dir = os.path.join(data_dir, "preprocessed")
+split_names = ("train_data", "train_labels", "validate_data", "validate_labels", "test_data", "test_labels")
+# mel filterbank, built once rather than on every spectrogram
+mel_basis = librosa.filters.mel(sr=sr, n_fft=n_fft, n_mels=n_mels).astype(np.float32)
+# periodic hann window applied to each frame (the librosa 0.8.0 stft default), kept in
+# float64 so the FFT runs in double precision as it does there
+window = scipy.signal.get_window("hann", n_fft)
 
 # scale S values to 0 to factor
 def minmax_scaling(S, factor):
     s_min = S.min()
-    s_max = S.max()
-    S_std = (S - s_min) / (s_max - s_min)
-    return (S_std * factor)
+    # divide then multiply in place on the one new array, in that order so the max
+    # maps exactly to factor
+    S_std = S - s_min
+    S_std /= S.max() - s_min
+    S_std *= factor
+    return S_std
+
+# conv + bias + relu traced into one graph, so grappler's remapper can fuse
+# them into a single conv op instead of writing out each intermediate
+# input and output are always NHWC, only the conv itself changes layout
+@tf.function
+def conv_relu(S, filter_weight, bias):
+    # cuDNN is fastest channels first, while the CPU conv kernels only support channels last
+    # (checked once per trace, so importing this module doesn't start up the GPU runtime)
+    data_format = "NCHW" if tf.config.list_physical_devices("GPU") else "NHWC"
+    if data_format == "NCHW":
+        S = tf.transpose(S, perm = [0,3,1,2])
+    conv = tf.nn.conv2d(S, filter_weight, strides = (1,1), padding = "SAME", data_format = data_format)
+    conv = tf.nn.relu(tf.nn.bias_add(conv, bias, data_format = data_format))
+    if data_format == "NCHW":
+        conv = tf.transpose(conv, perm = [0,2,3,1])
+    return conv
+
+# one conv block of the models: conv + bias + relu followed by a 2x2 max pool
+@tf.function
+def conv_relu_pool(S, filter_weight, bias):
+    return tf.nn.max_pool2d(conv_relu(S, filter_weight, bias), ksize = 2, strides = 2, padding = "VALID")
+
+# write the png and/or wav for a single masked spectrogram if names are given
+def save_masked(masked_s, png_name = None, wav_name = None):
+    if png_name is not None:
+        masked_img = spectrogram_img(masked_s, png_name)
+    if wav_name is not None:
+        wav = librosa.feature.inverse.mel_to_audio(masked_s)
+        write(wav_name, sr, wav)
 
-# given a spectrogram input and FIRST LAYER model weights, produce the masked input
+# split interpret_activation's png_name/wav_name into one entry per spectrogram in the batch
+# a single spectrogram's name (or list of filter names) may be given directly
+def names_per_spectrogram(names, batch_sz, filter_index):
+    if names is None:
+        return [None] * batch_sz
+
+    # one name for a single filter, a list of names for all filters
+    def is_entry(name):
+        if filter_index is not None:
+            return isinstance(name, str)
+        return isinstance(name, (list, tuple)) and all(isinstance(n, str) for n in name)
+
+    if batch_sz == 1 and is_entry(names):
+        return [names]
+    if isinstance(names, str) or len(names) != batch_sz or not all(n is None or is_entry(n) for n in names):
+        raise ValueError(
+            "png_name and wav_name must have one entry per spectrogram (%d), each a %s"
+            % (batch_sz, "file name" if filter_index is not None else "list of file names per filter")
+        )
+    return names
+
+# given spectrogram inputs and FIRST LAYER model weights, produce the masked inputs
 # according to the model's activations
+# the whole batch goes through the conv in one call, so stack spectrograms rather than
+# calling this once per spectrogram
 # if a png or wav file name is given, produce the png/wav file
 # if no filter_index is specified, create representations for all filter activations
 # png_name and wav_name must be a list of length num_filters in this case
+# for a batch of more than one spectrogram, png_name and wav_name must be lists
+# with one of the above per spectrogram
 
-# S: input spectrogram of shape (1, 128, 128, 1)
+# S: input spectrograms of shape (batchSz, 128, 128, 1)
 # weights: list of (weight, bias) tuples
 # index of desired filter to interpret
+# returns masked spectrograms of shape (batchSz, 128, 128) for a single filter,
+# or (batchSz, 128, 128, 32) for all filters
 def interpret_activation(S, weights, filter_index = None, png_name = None, wav_name = None):
     filter_weight, bias = weights
 
-    conv = tf.nn.conv2d(S, filter_weight, strides = (1,1), padding = "SAME")
-    conv = tf.nn.relu(tf.nn.bias_add(conv, bias)) # shape = (batchSz, 128, 128, 32)
-    conv = conv.numpy()
+    conv = conv_relu(S, filter_weight, bias).numpy() # shape = (batchSz, 128, 128, 32)
+    batch_sz = conv.shape[0]
 
-    S = np.squeeze(S)
+    S = np.reshape(S, conv.shape[:3]) # shape = (batchSz, 128, 128)
+    png_name = names_per_spectrogram(png_name, batch_sz, filter_index)
+    wav_name = names_per_spectrogram(wav_name, batch_sz, filter_index)
 
     if filter_index is not None:
-        filter_activations = np.reshape(conv[:, :, :, filter_index], (128, 128))
-        # scale activations to 0 to 1 to create a mask
-        activation_mask = minmax_scaling(filter_activations, 1)
-        # element wise multiply to scale spectrogram accordingly
-        masked = np.multiply(S, activation_mask)
-        if png_name is not None:
-            masked_img = spectrogram_img(masked, png_name)
-        if wav_name is not None:
-            wav = librosa.feature.inverse.mel_to_audio(masked)
-            write(wav_name, sr, wav)
+        filter_activations = conv[:, :, :, filter_index] # shape = (batchSz, 128, 128)
+        # scale each spectrogram's activations to 0 to 1 in place to create the masks
+        a_min = filter_activations.min(axis=(1, 2), keepdims=True)
+        a_max = filter_activations.max(axis=(1, 2), keepdims=True)
+        np.subtract(filter_activations, a_min, out = filter_activations)
+        activation_masks = np.divide(filter_activations, a_max - a_min, out = filter_activations)
+        # element wise multiply to scale spectrograms accordingly
+        masked = np.multiply(S, activation_masks, out = activation_masks)
+
+        for b in range(batch_sz):
+            save_masked(masked[b], png_name[b], wav_name[b])
     else:
-        masked = []
-        # iterate through each filter
-        for i in range(tf.shape(conv)[-1]):
-            filter_activations = np.reshape(conv[:, :, :, i], (128, 128))
-            # scale activations to 0 to 1 to create a mask
-            activation_mask = minmax_scaling(filter_activations, 1)
-            # element wise multiply to scale spectrogram accordingly
-            masked_s = np.multiply(S, activation_mask)
-
-            if png_name is not None:
-                masked_img = spectrogram_img(masked_s, png_name[i])
-            if wav_name is not None:
-                wav = librosa.feature.inverse.mel_to_audio(masked_s)
-                write(wav_name[i], sr, wav)
+        # scale every spectrogram's activations for every filter to 0 to 1 at once to create the masks
+        a_min = conv.min(axis=(1, 2), keepdims=True)
+        a_max = conv.max(axis=(1, 2), keepdims=True)
+        activation_masks = (conv - a_min) / (a_max - a_min)
+        # element wise multiply to scale spectrograms accordingly, shape = (batchSz, 128, 128, 32)
+        masked = S[:, :, :, np.newaxis] * activation_masks
+
+        # write out each filter's representation
+        for b in range(batch_sz):
+            for i in range(masked.shape[-1]):
+                save_masked(
+                    masked[b, :, :, i],
+                    png_name[b][i] if png_name[b] is not None else None,
+                    wav_name[b][i] if wav_name[b] is not None else None,
+                )
 
     return masked
 
+# nearest neighbour upsample a (batchSz, x, y, channels) array to (batchSz, 2x, 2y, channels)
+def upsample(x):
+    return np.repeat(np.repeat(x, 2, axis=1), 2, axis=2)
+
+# build the deconvolution for a fixed set of weights
+# the flipped filters are computed once here, so the returned function can be
+# called on many spectrograms without rebuilding them
+
+# weights: [(conv1_weights, conv1_bias), (conv2_weights, conv2_bias)]
+def make_deconv(weights):
+    # flip each filter left-right and up-down and reverse the dimensions of its in
+    # and out channels, stored as contiguous tensors
+    flipped = [
+        tf.constant(np.ascontiguousarray(np.transpose(filter_weight[::-1, ::-1, :, :], (0,1,3,2))))
+        for filter_weight, _ in weights
+    ]
+
+    # S: input spectrogram of shape (1, 128, 128, 1)
+    def deconv(S):
+        conv = S
+        # get the activation from second conv layer with shape (1, 32, 32, 64)
+        for filter_weight, filter_bias in weights:
+            conv = conv_relu_pool(conv, filter_weight, filter_bias)
+        conv = conv.numpy()
+
+        # upsample the conv output to double dimensions
+        upsampled_1 = upsample(conv)
+        # convolve with the flipped second layer filter
+        deconv_1 = tf.nn.conv2d(upsampled_1, flipped[1], strides = (1,1), padding = "SAME")
+
+        # repeat with first layer weights
+        upsampled_2 = upsample(deconv_1.numpy())
+        deconv_2 = tf.nn.conv2d(upsampled_2, flipped[0], strides = (1,1), padding = "SAME")
+
+        return np.squeeze(deconv_2.numpy())
+
+    return deconv
+
 # given a list of tuples of model weights, get the final conv activation
 # and upsample and deconvolve to get original dimensions of 128x128
 # convert this activation mapping into a png and wav
@@ -80,31 +197,12 @@ def interpret_activation(S, weights, filter_index = None, png_name = None, wav_n
 
 # S: input spectrogram of shape (1, 128, 128, 1)
 # weights: [(conv1_weights, conv1_bias), (conv2_weights, conv2_bias)]
-def deconvolve_and_interpret(S, weights, png_name = None, wav_name = None):
-    conv = S
-    # get the activation from second conv layer with shape (1, 32, 32, 64)
-    for filter_weight, filter_bias in weights:
-        conv = tf.nn.conv2d(conv, filter_weight, strides = (1,1), padding = "SAME")
-        conv = tf.nn.relu(tf.nn.bias_add(conv, filter_bias))
-        conv = tf.keras.layers.MaxPool2D((2,2), strides=2)(conv)
-
-    # upsample the conv output to double dimensions
-    upsampled_1 = tf.keras.layers.UpSampling2D(size=(2, 2))(conv)
-    # flip filter's left-right and up-down
-    filter_weight = filter_weight[::-1, ::-1, :, :]
-    # reverse the dimensions of in and out channels
-    filter_weight = tf.transpose(filter_weight, perm = [0,1,3,2])
-    # convolve with the flipped filter
-    deconv_1 = tf.nn.conv2d(upsampled_1, filter_weight, strides = (1,1), padding = "SAME")
-    
-    # repeat with first layer weights
-    upsampled_2 = tf.keras.layers.UpSampling2D(size=(2, 2))(deconv_1)
-    filter_weight = weights[0][0]
-    filter_weight = filter_weight[::-1, ::-1, :, :]
-    filter_weight = tf.transpose(filter_weight, perm = [0,1,3,2])
-    deconv_2 = tf.nn.conv2d(upsampled_2, filter_weight, strides = (1,1), padding = "SAME")
-
-    deconv_2 = np.squeeze(deconv_2.numpy())
+# deconv: optional make_deconv(weights) result, to reuse its flipped filters when
+# deconvolving many spectrograms with the same weights
+def deconvolve_and_interpret(S, weights, png_name = None, wav_name = None, deconv = None):
+    if deconv is None:
+        deconv = make_deconv(weights)
+    deconv_2 = deconv(S)
 
     if png_name is not None:
         img = spectrogram_img(deconv_2, png_name)
@@ -116,21 +214,38 @@ def deconvolve_and_interpret(S, weights, png_name = None, wav_name = None):
 
 
 # calculate log scaled melspectrogram from wav file
-def wav_to_spectrogram(filename):
-    y, sr = librosa.load(filename)
-
-    S = librosa.feature.melspectrogram(
-        y, sr=sr, n_fft=n_fft, hop_length=hop_length, n_mels=n_mels
-    )
-    # log scale
-    S = np.log(S + 1e-9)
+# workers: number of threads for the FFT (-1 for all cores)
+def wav_to_spectrogram(filename, workers = -1):
+    # decode with libsndfile directly instead of going through librosa.load,
+    # then downmix and resample the same way librosa.load would
+    y, file_sr = sf.read(filename, dtype = "float32")
+    y = librosa.to_mono(y.T)
+    if file_sr != sr:
+        y = librosa.resample(y, orig_sr=file_sr, target_sr=sr)
+
+    # centred, reflect padded frames of the signal, as librosa 0.8.0's stft takes them
+    # (the version the notebook pins; from 0.10 librosa pads with zeros by default)
+    y = np.pad(y, n_fft // 2, mode="reflect")
+    frames = librosa.util.frame(y, frame_length=n_fft, hop_length=hop_length)
+    # double precision FFT, stored as complex64 like librosa 0.8.0's stft output
+    D = scipy.fft.rfft(frames * window[:, np.newaxis], axis=0, workers=workers).astype(np.complex64)
+    # power spectrogram straight from the real and imaginary parts, without taking |D| first
+    S = D.real * D.real
+    S += D.imag * D.imag
+    # projected onto the cached mel filterbank (meant to match librosa 0.8.0's
+    # feature.melspectrogram defaults)
+    S = np.dot(mel_basis, S)
+    # log scale in place, keeping float32
+    np.add(S, np.float32(1e-9), out=S)
+    np.log(S, out=S)
     return S, S.min(), S.max()
 
 # https://stackoverflow.com/questions/56719138/how-can-i-save-a-librosa-spectrogram-plot-as-a-specific-sized-image/57204349
 # get image from spectrogram and save it as 'name'
 def spectrogram_img(S, name):
-    # scale to 0 to 255 (bw png pixel values)
-    img = 255 - np.flip(minmax_scaling(S, 255).astype(np.uint8), axis=0)
+    # scale the vertically flipped view to 0 to 255 (bw png pixel values), then invert in place
+    img = minmax_scaling(S[::-1], 255).astype(np.uint8)
+    np.subtract(255, img, out=img)
     io.imsave(name, img)
     return img
 
@@ -146,31 +261,65 @@ def visualize_spectro(S):
 
 # revert from spectrogram image array to spectrogram
 def revert_to_spectro(img, s_min, s_max):
-    scaled = np.flip((255 - img), axis=0)
-    return (scaled / 255) * (s_max - s_min) + s_min
-
-# takes in inputs and labels and shuffles them together
-def shuffle_data(inputs, labels):
-    indices = np.arange(labels.shape[0])
-    np.random.shuffle(indices)
-    shuffled_in = inputs[indices, :, :]
-    shuffled_labels = np.take(labels, indices)
-    return shuffled_in, shuffled_labels
-
-# splits spectrogram into 10 square matrices
-def make_square(genre, s):
-    genre.extend(
-        [s[:, :128], 
-        s[:, 128:2*128], 
-        s[:, 2*128:3*128], 
-        s[:, 3*128:4*128], 
-        s[:, 4*128:5*128], 
-        s[:, 5*128:6*128],
-        s[:, 6*128:7*128], 
-        s[:, 7*128:8*128], 
-        s[:, 8*128:9*128], 
-        s[:, 9*128:10*128]]
-    )
+    scaled = np.subtract(255, img[::-1], dtype=np.float32)
+    scaled *= (s_max - s_min) / 255
+    scaled += s_min
+    return scaled
+
+# splits spectrogram into 10 square matrices, returned as one (10, 128, 128) array
+def make_square(s):
+    return np.ascontiguousarray(s[:, :10*128].reshape(128, 10, 128).transpose(1, 0, 2))
+
+# spectrograms only for a chunk of paths, so workers don't send the unused min/max back
+# single threaded FFT, since the worker processes already use every core
+def _specs_only(paths):
+    return [wav_to_spectrogram(path, workers = 1)[0] for path in paths]
+
+# start computing spectrograms for every wav in dir on executor's worker processes,
+# chunksize files per task to keep pickling overhead down
+# skip: path of a wav to leave out (eg. a corrupt file)
+# returns the number of files and the list of futures for their spectrograms, in order
+def queue_genre(executor, dir, skip = None, chunksize = 8):
+    paths = [wav.path for wav in os.scandir(dir) if wav.path != skip]
+    futures = [executor.submit(_specs_only, paths[i:i + chunksize]) for i in range(0, len(paths), chunksize)]
+    return len(paths), futures
+
+# split a queued genre's spectrograms into squares
+def load_genre(n_files, futures):
+    genre = np.empty((n_files * 10, 128, 128), dtype = np.float32)
+    # write each chunk's squares in as soon as its spectrograms come back
+    i = 0
+    for j in range(len(futures)):
+        for s in futures[j].result():
+            genre[i*10:(i+1)*10] = make_square(s)
+            i += 1
+        # drop the used future so its full spectrograms can be freed
+        futures[j] = None
+
+    np.random.shuffle(genre)
+    return genre
+
+# gather the [start:end] squares of every genre into one preallocated array in shuffled order,
+# labelling each genre's squares with its index in genres
+def split_genres(genres, start, end):
+    counts = [len(genre[start:end]) for genre in genres]
+    data = np.empty((sum(counts), 128, 128), dtype = np.float32)
+    labels = np.empty(sum(counts), dtype = np.int8)
+    # scatter each genre straight into its shuffled rows, rather than shuffling a full copy afterwards
+    rows = np.random.permutation(sum(counts))
+    offset = 0
+    for label, (genre, count) in enumerate(zip(genres, counts)):
+        data[rows[offset:offset + count]] = genre[start:end]
+        labels[rows[offset:offset + count]] = label
+        offset += count
+    return data, labels
+
+# play a waveform straight from memory, blocking until it finishes
+def play(wav):
+    # imported here since sounddevice needs PortAudio, which only the playback tests use
+    import sounddevice as sd
+    sd.play(wav, sr)
+    sd.wait()
 
 # test if masking makes audible sense for a spectrogram
 def play_masked_spectrogram_test():
@@ -182,196 +331,50 @@ def play_masked_spectrogram_test():
     # img = spectrogram_img(spectrogram, "test.png")
     # reverted = revert_to_spectro(img, s_min, s_max)
     wav = librosa.feature.inverse.mel_to_audio(masked_s)
-    write('masked.wav', sr, wav)
-    playsound('masked.wav')
+    play(wav)
 
 # preprocess the data into test, validate, and train groups
-def main():
-    blues = []
-    classical = []
-    country = []
-    disco = []
-    hiphop = []
-    jazz = []
-    metal = []
-    pop = []
-    reggae = []
-    rock = []
-    blues_labels = []
-    classical_labels = []
-    country_labels = []
-    disco_labels = []
-    hiphop_labels = []
-    jazz_labels = []
-    metal_labels = []
-    pop_labels = []
-    reggae_labels = []
-    rock_labels = []
-
-    for wav in os.scandir("../data/blues"):
-        s, _, _ = wav_to_spectrogram(wav.path)
-        make_square(blues, s)
-        blues_labels.extend([0]*10)
-    shuffle(blues)
-    blues = np.array(blues)
-    print("blues done")
-    for wav in os.scandir("../data/classical"):
-        s, _, _ = wav_to_spectrogram(wav.path)
-        make_square(classical, s)
-        classical_labels.extend([1]*10)
-    shuffle(classical)
-    classical = np.array(classical)
-    print("classical done")
-    for wav in os.scandir("../data/country"):
-        s, _, _ = wav_to_spectrogram(wav.path)
-        make_square(country, s)
-        country_labels.extend([2]*10)
-    shuffle(country)
-    country = np.array(country)
-    print("country done")
-    for wav in os.scandir("../data/disco"):
-        s, _, _ = wav_to_spectrogram(wav.path)
-        make_square(disco, s)
-        disco_labels.extend([3]*10)
-    shuffle(disco)
-    disco = np.array(disco)
-    print("disco done")
-    for wav in os.scandir("../data/hiphop"):
-        s, _, _ = wav_to_spectrogram(wav.path)
-        make_square(hiphop, s)
-        hiphop_labels.extend([4]*10)
-    shuffle(hiphop)
-    hiphop = np.array(hiphop)
-    print("hiphop done")
-    for wav in os.scandir("../data/jazz"):
-        if wav.path != "../data/jazz/jazz.00054.wav":
-            s, _, _ = wav_to_spectrogram(wav.path)
-            make_square(jazz, s)
-            jazz_labels.extend([5]*10)
-    shuffle(jazz)
-    jazz = np.array(jazz)
-    print("jazz done")
-    for wav in os.scandir("../data/metal"):
-        s, _, _ = wav_to_spectrogram(wav.path)
-        make_square(metal, s)
-        metal_labels.extend([6]*10)
-    shuffle(metal)
-    metal = np.array(metal)
-    print("metal done")
-    for wav in os.scandir("../data/pop"):
-        s, _, _ = wav_to_spectrogram(wav.path)
-        make_square(pop, s)
-        pop_labels.extend([7]*10)
-    shuffle(pop)
-    pop = np.array(pop)
-    print("pop done")
-    for wav in os.scandir("../data/reggae"):
-        s, _, _ = wav_to_spectrogram(wav.path)
-        make_square(reggae, s)
-        reggae_labels.extend([8]*10)
-    shuffle(reggae)
-    reggae = np.array(reggae)
-    print("reggae done")
-    for wav in os.scandir("../data/rock"):
-        s, _, _ = wav_to_spectrogram(wav.path)
-        make_square(rock, s)
-        rock_labels.extend([9]*10)
-    shuffle(rock)
-    rock = np.array(rock)
-    print("rock done")
-
-    train_data = np.concatenate(
-        (
-            blues[:800],
-            classical[:800],
-            country[:800],
-            disco[:800],
-            hiphop[:800],
-            jazz[:800],
-            metal[:800],
-            pop[:800],
-            reggae[:800],
-            rock[:800],
-        ),
-        axis=0,
-    )
-
-    train_labels = np.array(
-        blues_labels[:800]
-        + classical_labels[:800]
-        + country_labels[:800]
-        + disco_labels[:800]
-        + hiphop_labels[:800]
-        + jazz_labels[:800]
-        + metal_labels[:800]
-        + pop_labels[:800]
-        + reggae_labels[:800]
-        + rock_labels[:800]
-    )
-
-    train_data, train_labels = shuffle_data(train_data, train_labels)
-
-    validate_data = np.concatenate(
-        (
-            blues[800:900],
-            classical[800:900],
-            country[800:900],
-            disco[800:900],
-            hiphop[800:900],
-            jazz[800:900],
-            metal[800:900],
-            pop[800:900],
-            reggae[800:900],
-            rock[800:900],
-        ),
-        axis=0,
-    )
-
-    validate_labels = np.array(
-        blues_labels[800:900]
-        + classical_labels[800:900]
-        + country_labels[800:900]
-        + disco_labels[800:900]
-        + hiphop_labels[800:900]
-        + jazz_labels[800:900]
-        + metal_labels[800:900]
-        + pop_labels[800:900]
-        + reggae_labels[800:900]
-        + rock_labels[800:900]
-    )
-
-    validate_data, validate_labels = shuffle_data(validate_data, validate_labels)
-
-    test_data = np.concatenate(
-        (
-            blues[900:],
-            classical[900:],
-            country[900:],
-            disco[900:],
-            hiphop[900:],
-            jazz[900:],
-            metal[900:],
-            pop[900:],
-            reggae[900:],
-            rock[900:],
-        ),
-        axis=0,
-    )
-
-    test_labels = np.array(
-        blues_labels[900:]
-        + classical_labels[900:]
-        + country_labels[900:]
-        + disco_labels[900:]
-        + hiphop_labels[900:]
-        + jazz_labels[900:]
-        + metal_labels[900:]
-        + pop_labels[900:]
-        + reggae_labels[900:]
-        + rock_labels[900:]
-    )
-    test_data, test_labels = shuffle_data(test_data, test_labels)
-    return (train_data, train_labels, validate_data, validate_labels, test_data, test_labels)
+# the groups are saved to cache_dir and memory-mapped from there on later calls
+# use_cache: set to False to recompute (and re-shuffle) the groups from the wav files
+# without reading or writing the cache
+def main(use_cache = True):
+    cache_paths = [os.path.join(cache_dir, name + ".npy") for name in split_names]
+    if use_cache and all(os.path.exists(path) for path in cache_paths):
+        return tuple(np.load(path, mmap_mode = "r") for path in cache_paths)
+
+    # queue every genre before collecting any, so the workers keep decoding the next
+    # genres while the current one is split into squares instead of idling between genres
+    with ProcessPoolExecutor(max_workers = os.cpu_count()) as executor:
+        queued = [queue_genre(executor, os.path.join(data_dir, name), skip = skip_wav) for name in genre_names]
+
+        genres = []
+        try:
+            for name, (n_files, futures) in zip(genre_names, queued):
+                genres.append(load_genre(n_files, futures))
+                print(name + " done")
+        except BaseException:
+            # cancel the genres still waiting to run, so leaving the executor only waits
+            # on the tasks already running rather than the rest of the dataset
+            for _, futures in queued:
+                for future in futures:
+                    if future is not None:
+                        future.cancel()
+            raise
+
+    train_data, train_labels = split_genres(genres, 0, 800)
+    validate_data, validate_labels = split_genres(genres, 800, 900)
+    test_data, test_labels = split_genres(genres, 900, None)
+    splits = (train_data, train_labels, validate_data, validate_labels, test_data, test_labels)
+
+    if use_cache:
+        os.makedirs(cache_dir, exist_ok = True)
+        for path, split in zip(cache_paths, splits):
+            # write to a temporary file and move it into place, so an interrupted save
+            # never leaves a truncated file under the name checked above
+            with open(path + ".tmp", "wb") as f:
+                np.save(f, split)
+            os.replace(path + ".tmp", path)
+    return splits
 
 # test auralisation procedure
 def auralise_test():
@@ -381,8 +384,11 @@ def auralise_test():
     filter_weight = np.ones((3, 3, 1, 32))
     bias = np.ones(32)
     weights = (filter_weight, bias)
-    masked = interpret_activation(spectrogram, weights, filter_index = 0, png_name = "conv1_filter1.png", wav_name = "conv1_filter1.wav")
-    playsound('conv1_filter1.wav')
+    masked = interpret_activation(spectrogram, weights, filter_index = 0, png_name = "conv1_filter1.png")
+    # invert once, then both keep the wav and play it from memory
+    wav = librosa.feature.inverse.mel_to_audio(masked[0])
+    write("conv1_filter1.wav", sr, wav)
+    play(wav)
     print(masked)
 
     img = spectrogram_img(spectrogram, "test.png")